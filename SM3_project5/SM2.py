@@ -1,7 +1,22 @@
-import random
+import sys
 import hashlib
 import base64
-from gmssl import sm3, func
+import functools
+from secrets import randbelow
+
+try:
+    # OpenSSL 提供 SM3 时直接使用 hashlib 的 C 实现
+    hashlib.new('sm3')
+    sm3 = func = None
+except ValueError:
+    from gmssl import sm3, func
+
+try:
+    # 可选依赖：gmpy2 使用 GMP 进行大整数运算，未安装时回退到内置 int
+    from gmpy2 import mpz, invert
+except ImportError:
+    mpz = int
+    invert = None
 
 class SM2:
     """
@@ -10,22 +25,31 @@ class SM2:
     """
     
     # SM2推荐椭圆曲线参数 (国密标准GB/T 32918.5-2016)
-    P = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF
-    A = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFC
-    B = 0x28E9FA9E9D9F5E344D5A9E4BCF6509A7F39789F515AB8F92DDBCBD414D940E93
-    N = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFF7203DF6B21C6052B53BBF40939D54123
-    Gx = 0x32C4AE2C1F1981195F9904466A39C9948FE30BBFF2660BE1715A4589334C74C7
-    Gy = 0xBC3736A2F4F6779C59BDCEE36B692153D0A9877CC62A474002DF32E52139F0A0
+    P = mpz(0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF)
+    A = mpz(0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFC)
+    B = mpz(0x28E9FA9E9D9F5E344D5A9E4BCF6509A7F39789F515AB8F92DDBCBD414D940E93)
+    N = mpz(0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFF7203DF6B21C6052B53BBF40939D54123)
+    Gx = mpz(0x32C4AE2C1F1981195F9904466A39C9948FE30BBFF2660BE1715A4589334C74C7)
+    Gy = mpz(0xBC3736A2F4F6779C59BDCEE36B692153D0A9877CC62A474002DF32E52139F0A0)
     G = (Gx, Gy)
+
+    # 固定基点G的预计算窗口表，窗口宽度为 _G_WINDOW 比特，模块加载时构建
+    _G_WINDOW = 4
+    _G_TABLE = None
     
     @staticmethod
     def inv_mod(a, p):
         """
-        使用扩展欧几里得算法计算模逆元
+        计算模逆元，优先使用 gmpy2.invert，否则在 Python 3.8+ 使用内置 pow(a, -1, p)（C 实现）
         :param a: 需要求逆的数
         :param p: 模数
         :return: a模p的逆元
         """
+        if invert is not None:
+            return invert(a, p)
+        if sys.version_info >= (3, 8):
+            return pow(a % p, -1, p)
+        # 旧版本回退到扩展欧几里得算法
         old_r, r = a, p
         old_s, s = 1, 0
         while r != 0:
@@ -38,64 +62,268 @@ class SM2:
     def _hash_message(message: bytes) -> int:
         """
         使用SM3算法计算消息的哈希值
-        :param message: 待哈希的消息（字节类型）
+        :param message: 待哈希的消息（bytes、bytearray、memoryview 等字节类对象）
         :return: 哈希值（整数形式）
         """
+        # 经 memoryview 转换：字节类对象照常接受，int/str 会抛出 TypeError
+        # （直接 bytes(n) 会把整数当作长度生成 n 个零字节）
+        return SM2._hash_bytes(bytes(memoryview(message)))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _hash_bytes(message: bytes) -> int:
+        """
+        _hash_message 的缓存实现，以不可变的 bytes 副本为键；
+        重复签名同一消息时不再重复哈希，缓存容量较小以免长期占用大量消息内存
+        :param message: 待哈希的消息（bytes）
+        :return: 哈希值（整数形式）
+        """
+        if sm3 is None:
+            return int.from_bytes(hashlib.new('sm3', message).digest(), 'big') % SM2.N
         digest = sm3.sm3_hash(func.bytes_to_list(message))  # 返回十六进制字符串
         return int(digest, 16) % SM2.N
 
+    @staticmethod
+    def _jac_double(X, Y, Z):
+        """
+        Jacobian坐标下的倍点运算，只用乘法和平方，无需求逆
+        :param X: 点的X坐标
+        :param Y: 点的Y坐标
+        :param Z: 点的Z坐标
+        :return: 2倍点(X3, Y3, Z3)
+        """
+        P = SM2.P
+        if Z == 0 or Y == 0:
+            return (1, 1, 0)  # 无穷远点
+        Z2 = Z * Z % P
+        A = Y * Y % P
+        B = 4 * X * A % P
+        C = 8 * A * A % P
+        D = (3 * X * X + SM2.A * Z2 * Z2) % P
+        X3 = (D * D - 2 * B) % P
+        Y3 = (D * (B - X3) - C) % P
+        Z3 = 2 * Y * Z % P
+        return (X3, Y3, Z3)
+
+    @staticmethod
+    def _jac_add(X1, Y1, Z1, X2, Y2, Z2):
+        """
+        Jacobian坐标下的点加法，只用乘法和平方，无需求逆
+        :param X1, Y1, Z1: 第一个点
+        :param X2, Y2, Z2: 第二个点
+        :return: 两点之和(X3, Y3, Z3)
+        """
+        P = SM2.P
+        if Z1 == 0:
+            return (X2, Y2, Z2)
+        if Z2 == 0:
+            return (X1, Y1, Z1)
+        Z1Z1 = Z1 * Z1 % P
+        Z2Z2 = Z2 * Z2 % P
+        U1 = X1 * Z2Z2 % P
+        U2 = X2 * Z1Z1 % P
+        S1 = Y1 * Z2 * Z2Z2 % P
+        S2 = Y2 * Z1 * Z1Z1 % P
+        if U1 == U2:
+            if S1 != S2:
+                return (1, 1, 0)  # P + (-P) = 无穷远点
+            return SM2._jac_double(X1, Y1, Z1)
+        H = (U2 - U1) % P
+        R = (S2 - S1) % P
+        HH = H * H % P
+        HHH = H * HH % P
+        V = U1 * HH % P
+        X3 = (R * R - HHH - 2 * V) % P
+        Y3 = (R * (V - X3) - S1 * HHH) % P
+        Z3 = H * Z1 * Z2 % P
+        return (X3, Y3, Z3)
+
+    @staticmethod
+    def _to_jacobian(point):
+        """
+        仿射坐标转Jacobian坐标，(0, 0)表示无穷远点
+        :param point: 仿射坐标点(x, y)
+        :return: Jacobian坐标点(X, Y, Z)
+        """
+        if point == (0, 0):
+            return (1, 1, 0)
+        return (point[0], point[1], 1)
+
+    @staticmethod
+    def _to_affine(X, Y, Z, p):
+        """
+        Jacobian坐标转仿射坐标，整个点运算过程只在这里求一次逆
+        :param X, Y, Z: Jacobian坐标点
+        :param p: 模数
+        :return: 仿射坐标点(x, y)
+        """
+        if Z == 0:
+            return (0, 0)
+        z_inv = SM2.inv_mod(Z, p)
+        z_inv2 = z_inv * z_inv % p
+        return (X * z_inv2 % p, Y * z_inv2 * z_inv % p)
+
     @staticmethod
     def ec_add(p1, p2, p):
         """
-        椭圆曲线上的点加法
+        椭圆曲线上的点加法（仿射坐标接口，内部使用Jacobian坐标）
         :param p1: 第一个点
         :param p2: 第二个点
         :param p: 模数
         :return: 两个点的和
         """
-        if p1 == (0, 0):
-            return p2
-        if p2 == (0, 0):
-            return p1
-        if p1[0] == p2[0] and p1[1] != p2[1]:
-            return (0, 0)
-        if p1 == p2:
-            lam = (3 * p1[0] * p1[0] + SM2.A) * SM2.inv_mod(2 * p1[1], p) % p
-        else:
-            lam = (p2[1] - p1[1]) * SM2.inv_mod(p2[0] - p1[0], p) % p
-        x3 = (lam * lam - p1[0] - p2[0]) % p
-        y3 = (lam * (p1[0] - x3) - p1[1]) % p
-        return (x3, y3)
+        X, Y, Z = SM2._jac_add(*SM2._to_jacobian(p1), *SM2._to_jacobian(p2))
+        return SM2._to_affine(X, Y, Z, p)
     
+    @staticmethod
+    def _cswap(bit, R0, R1):
+        """
+        条件交换：bit为1时交换R0和R1，用异或掩码实现，不依赖分支
+        :param bit: 交换条件（0或1）
+        :param R0: 第一个点(X, Y, Z)
+        :param R1: 第二个点(X, Y, Z)
+        :return: 交换后的(R0, R1)
+        """
+        mask = -bit
+        t = [mask & (a ^ b) for a, b in zip(R0, R1)]
+        return (tuple(a ^ x for a, x in zip(R0, t)),
+                tuple(b ^ x for b, x in zip(R1, t)))
+
+    @staticmethod
+    def _jac_mult(k, point):
+        """
+        Jacobian坐标下的点乘法（Montgomery阶梯），结果保持Jacobian坐标
+        每一比特固定执行一次点加和一次倍点，避免随密钥比特变化的分支
+        :param k: 乘数
+        :param point: 椭圆曲线上的点（仿射坐标）
+        :return: 点乘的结果(X, Y, Z)
+        """
+        # 循环内用到的方法提前绑定为局部变量，省去每次迭代的类属性查找
+        jac_add, jac_double, cswap = SM2._jac_add, SM2._jac_double, SM2._cswap
+        R0 = (1, 1, 0)
+        R1 = SM2._to_jacobian(point)  # 始终保持 R1 = R0 + point
+        # ec_mult是公开接口，模块内签名/验签不调用它，但外部调用方可能传入秘密乘数，
+        # 因此循环次数固定取n的比特长度而非k.bit_length()，不随乘数的比特长度变化
+        for i in reversed(range(max(SM2.N.bit_length(), k.bit_length()))):
+            bit = (k >> i) & 1
+            R0, R1 = cswap(bit, R0, R1)
+            R1 = jac_add(*R0, *R1)
+            R0 = jac_double(*R0)  # 倍点直接调用，不经过点加中的相等判断
+            R0, R1 = cswap(bit, R0, R1)
+        return R0
+
     @staticmethod
     def ec_mult(k, point, p):
         """
-        椭圆曲线上的点乘法（快速幂算法）
+        椭圆曲线上的点乘法（Jacobian坐标计算，最后只求一次逆）
         :param k: 乘数
         :param point: 椭圆曲线上的点
         :param p: 模数
         :return: 点乘的结果
         """
-        result = (0, 0)
-        addend = point
-        while k:
-            if k & 1:
-                result = SM2.ec_add(result, addend, p)
-            addend = SM2.ec_add(addend, addend, p)
-            k >>= 1
-        return result
+        return SM2._to_affine(*SM2._jac_mult(k, point), p)
     
+    @staticmethod
+    def _jac_mult_shamir(k1, point1, k2, point2):
+        """
+        Shamir技巧同时计算[k1]point1 + [k2]point2，两个点乘共用一条倍点链
+        预计算 T[i][j] = [i]point1 + [j]point2（i, j 取 2 比特窗口值 0~3），
+        每个窗口先倍点两次，再加上一个表项
+        :param k1: 第一个乘数
+        :param point1: 第一个点（仿射坐标）
+        :param k2: 第二个乘数
+        :param point2: 第二个点（仿射坐标）
+        :return: 点乘之和(X, Y, Z)
+        """
+        P1, P2 = SM2._to_jacobian(point1), SM2._to_jacobian(point2)
+        col = [(1, 1, 0)]
+        for _ in range(3):
+            col.append(SM2._jac_add(*col[-1], *P2))
+        table = [col]
+        for _ in range(3):
+            table.append([SM2._jac_add(*pt, *P1) for pt in table[-1]])
+
+        jac_add, jac_double = SM2._jac_add, SM2._jac_double
+        # 验签时乘数都是公开值，循环次数直接取两者的实际比特长度，跳过高位的全零窗口
+        n = max(k1.bit_length(), k2.bit_length())
+        result = (1, 1, 0)
+        for i in reversed(range(0, n, 2)):
+            result = jac_double(*jac_double(*result))
+            w1, w2 = (k1 >> i) & 3, (k2 >> i) & 3
+            if w1 or w2:
+                result = jac_add(*result, *table[w1][w2])
+        return result
+
+    @staticmethod
+    def _build_g_table():
+        """
+        预计算固定基点G的窗口表：table[i][d] = [d * 2^(w*i)]G
+        表项统一转换为Z=1的形式，便于后续直接相加
+        :return: 按窗口分组的Jacobian坐标点表
+        """
+        w = SM2._G_WINDOW
+        windows = (SM2.N.bit_length() + w - 1) // w
+        base = SM2._to_jacobian(SM2.G)
+        table = []
+        for _ in range(windows):
+            row = [(1, 1, 0)]
+            for _ in range((1 << w) - 1):
+                row.append(SM2._jac_add(*row[-1], *base))
+            base = SM2._jac_add(*row[-1], *base)  # [2^w]base，作为下一个窗口的基点
+            table.append([SM2._to_jacobian(SM2._to_affine(*pt, SM2.P)) for pt in row])
+        return table
+
+    @staticmethod
+    def _jac_mult_fixed_base(k):
+        """
+        利用预计算表计算[k]G，按w比特窗口查表相加，无需倍点运算
+        签名的k和私钥d都走这条路径：每个窗口都固定加上row[digit]（digit为0时即无穷远点），
+        不再根据密钥比特跳过窗口
+        :param k: 乘数
+        :return: 点乘的结果(X, Y, Z)
+        """
+        jac_add, w = SM2._jac_add, SM2._G_WINDOW
+        mask = (1 << w) - 1
+        k %= SM2.N
+        result = (1, 1, 0)
+        for row in SM2._G_TABLE:
+            result = jac_add(*result, *row[k & mask])
+            k >>= w
+        return result
+
+    @staticmethod
+    def ec_mult_fixed_base(k):
+        """
+        固定基点G的点乘法[k]G（查预计算表）
+        :param k: 乘数
+        :return: 点乘的结果
+        """
+        return SM2._to_affine(*SM2._jac_mult_fixed_base(k), SM2.P)
+
     def __init__(self):
         self.private_key = None  # 私钥
         self.public_key = None  # 公钥
     
+    @property
+    def private_key(self):
+        """私钥d"""
+        return self._private_key
+
+    @private_key.setter
+    def private_key(self, d):
+        """
+        设置私钥时同步预计算签名用的 (1 + d)^-1 mod n，私钥不变则无需重复求逆
+        """
+        self._private_key = d
+        self._d_inv = SM2.inv_mod(1 + d, SM2.N) if d else None
+
     def generate_key_pair(self):
         """
         生成SM2密钥对
         :return: 私钥和公钥
         """
-        self.private_key = random.randint(1, SM2.N - 1)  # 随机生成私钥
-        self.public_key = SM2.ec_mult(self.private_key, SM2.G, SM2.P)  # 计算公钥
+        self.private_key = 1 + randbelow(SM2.N - 1)  # 用密码学安全随机数生成私钥，取值[1, n-1]
+        self.public_key = SM2.ec_mult_fixed_base(self.private_key)  # 计算公钥
         return self.private_key, self.public_key
     
     def sign(self, message):
@@ -113,11 +341,11 @@ class SM2:
             e = 1
             
         while True:
-            # 随机生成k值
-            k = random.randint(1, SM2.N - 1)
+            # 随机生成k值：必须使用密码学安全随机数，k可预测或重复都会泄露私钥
+            k = 1 + randbelow(SM2.N - 1)
             
             # 计算椭圆曲线点(x1, y1) = [k]G
-            x1, y1 = SM2.ec_mult(k, SM2.G, SM2.P)
+            x1, y1 = SM2.ec_mult_fixed_base(k)
             
             # 计算r = (e + x1) mod n
             r = (e + x1) % SM2.N
@@ -125,7 +353,7 @@ class SM2:
                 continue
                 
             # 计算s = ((1 + d)^-1 * (k - r*d)) mod n
-            s = (SM2.inv_mod(1 + self.private_key, SM2.N) * (k - r * self.private_key)) % SM2.N
+            s = (self._d_inv * (k - r * self.private_key)) % SM2.N
             if s == 0:
                 continue
                 
@@ -156,14 +384,15 @@ class SM2:
             return False
             
         # 计算椭圆曲线点(x1, y1) = [s]G + [t]P
-        sg = SM2.ec_mult(s, SM2.G, SM2.P)
-        tp = SM2.ec_mult(t, self.public_key, SM2.P)
-        x1, _ = SM2.ec_add(sg, tp, SM2.P)
+        x1, _ = SM2._to_affine(*SM2._jac_mult_shamir(s, SM2.G, t, self.public_key), SM2.P)
         
         # 验证R = (e + x1) mod n
         return (e + x1) % SM2.N == r
 
 
+SM2._G_TABLE = SM2._build_g_table()
+
+
 # 使用示例
 if __name__ == "__main__":
     sm2 = SM2()
@@ -12,6 +12,15 @@ import cv2
 import numpy as np
 import os
 
+# -------------------- 工具函数 --------------------
+def _text_to_bits(text: str) -> np.ndarray:
+    """将任意字符串按 UTF-8 编码后展开为比特数组（uint8，每字节 8 位，高位在前）"""
+    return np.unpackbits(np.frombuffer(text.encode('utf-8'), dtype=np.uint8))
+
+def _bits_to_text(bits: np.ndarray) -> str:
+    """将比特数组按 8 位打包为字节，再按 UTF-8 解码（无法解码的字节以替换符表示）"""
+    return np.packbits(bits[:bits.size // 8 * 8]).tobytes().decode('utf-8', errors='replace')
+
 # -------------------- 嵌入函数 --------------------
 def embed_lsb(src_path: str,
               secret: str,
@@ -33,24 +42,20 @@ def embed_lsb(src_path: str,
     if img is None:
         raise FileNotFoundError(f'无法读取 {src_path}')
 
-    # 将文本转为定长二进制串（每字符 8 位）
-    bin_stream = ''.join(f'{ord(ch):08b}' for ch in secret)      # 例：'Hi' -> '0100100001101001'
-    total_bits = len(bin_stream)
+    # 将文本按 UTF-8 编码后展开为比特数组（每字节 8 位，高位在前）
+    bits = _text_to_bits(secret)      # 例：'Hi' -> [0,1,0,0,1,0,0,0, 0,1,1,0,1,0,0,1]
+    total_bits = bits.size
 
-    # 只使用 R 通道，展平成一维向量方便逐像素处理
-    r_channel = img[:, :, 2].flatten()
+    # 只使用 R 通道（视图，修改直接作用于 img）
+    r_channel = img[:, :, 2]
 
     if total_bits > r_channel.size:
         raise ValueError('文本过长，当前图像容量不足')
 
-    # 逐位嵌入：把每个字节最低位替换为信息位
-    for idx, bit in enumerate(bin_stream):
-        pixel_val = r_channel[idx]
-        # 0xFE = 11111110，先清零最低位，再或上目标比特
-        r_channel[idx] = (pixel_val & 0xFE) | int(bit)
+    # 一次性嵌入：0xFE = 11111110，先清零最低位，再或上目标比特
+    r_channel.flat[:total_bits] = (r_channel.flat[:total_bits] & 0xFE) | bits
 
-    # 将修改后的 R 通道写回并保存
-    img[:, :, 2] = r_channel.reshape(img.shape[:2])
+    # 保存含水印图像
     os.makedirs(os.path.dirname(dst_path), exist_ok=True)
     cv2.imwrite(dst_path, img)
     print(f'[+] 水印已嵌入并保存至 {dst_path}')
@@ -65,7 +70,7 @@ def extract_lsb(img_path: str, text_len: int) -> str:
     img_path : str
         含水印图片路径
     text_len : int
-        原始文本字符长度（用于计算应取多少 bit）
+        原始文本的 UTF-8 字节长度（用于计算应取多少 bit，ASCII 文本即字符数）
 
     返回
     ----
@@ -76,46 +81,36 @@ def extract_lsb(img_path: str, text_len: int) -> str:
     if img is None:
         raise FileNotFoundError(f'无法读取 {img_path}')
 
-    # 只取 R 通道
-    r_channel = img[:, :, 2].flatten()
+    # 只取 R 通道前 need_bits 个像素的最低位
     need_bits = text_len * 8
+    bits = img[:, :, 2].flat[:need_bits] & 1
 
-    # 收集最低位
-    bits = [str(r_channel[i] & 1) for i in range(need_bits)]
-
-    # 每 8 位转成一个字符
-    chars = []
-    for i in range(0, len(bits), 8):
-        byte = ''.join(bits[i:i+8])
-        if len(byte) == 8:
-            chars.append(chr(int(byte, 2)))
-    return ''.join(chars)
+    # 每 8 位打包成一个字节，再按 UTF-8 解码
+    return _bits_to_text(bits)
 
 # -------------------- 攻击函数 --------------------
-def attack_flip(src: str, dst: str):
-    """水平镜像翻转"""
-    img = cv2.imread(src)
-    cv2.imwrite(dst, cv2.flip(img, 1))
+# 攻击函数直接接收并返回图像数组，由调用方负责读写文件，
+# 这样同一张含水印图像只需解码一次即可施加多种攻击
+def attack_flip(img: np.ndarray) -> np.ndarray:
+    """水平镜像翻转（返回视图，不拷贝像素）"""
+    return img[:, ::-1]
 
-def attack_translate(src: str, dst: str, dx: int = 10, dy: int = 10):
+def attack_translate(img: np.ndarray, dx: int = 10, dy: int = 10) -> np.ndarray:
     """平移攻击（空白处填黑）"""
-    img = cv2.imread(src)
     h, w = img.shape[:2]
     M = np.float32([[1, 0, dx], [0, 1, dy]])
-    cv2.imwrite(dst, cv2.warpAffine(img, M, (w, h)))
+    return cv2.warpAffine(img, M, (w, h))
 
-def attack_crop_resize(src: str, dst: str, ratio: float = 0.1):
+def attack_crop_resize(img: np.ndarray, ratio: float = 0.1) -> np.ndarray:
     """中心裁剪后恢复原尺寸"""
-    img = cv2.imread(src)
     h, w = img.shape[:2]
     dh, dw = int(h * ratio), int(w * ratio)
     cropped = img[dh:h - dh, dw:w - dw]
-    cv2.imwrite(dst, cv2.resize(cropped, (w, h)))
+    return cv2.resize(cropped, (w, h))
 
-def attack_contrast(src: str, dst: str, alpha: float = 1.5, beta: int = 0):
+def attack_contrast(img: np.ndarray, alpha: float = 1.5, beta: int = 0) -> np.ndarray:
     """线性对比度拉伸"""
-    img = cv2.imread(src)
-    cv2.imwrite(dst, cv2.convertScaleAbs(img, alpha=alpha, beta=beta))
+    return cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
 
 # -------------------- 演示 --------------------
 if __name__ == '__main__':
@@ -128,15 +123,17 @@ if __name__ == '__main__':
     # 1. 嵌入
     embed_lsb(ORIGINAL, WATERMARK, STEGO_FILE)
 
-    # 2. 施加攻击
-    attack_flip(STEGO_FILE,      'data/attacks/flip.png')
-    attack_translate(STEGO_FILE, 'data/attacks/trans.png')
-    attack_crop_resize(STEGO_FILE, 'data/attacks/crop.png')
-    attack_contrast(STEGO_FILE,   'data/attacks/contrast.png')
+    # 2. 施加攻击（含水印图像只解码一次）
+    stego = cv2.imread(STEGO_FILE, cv2.IMREAD_UNCHANGED)
+    cv2.imwrite('data/attacks/flip.png',     attack_flip(stego))
+    cv2.imwrite('data/attacks/trans.png',    attack_translate(stego))
+    cv2.imwrite('data/attacks/crop.png',     attack_crop_resize(stego))
+    cv2.imwrite('data/attacks/contrast.png', attack_contrast(stego))
 
     # 3. 提取并打印
-    print('提取结果（无攻击） :', extract_lsb(STEGO_FILE, len(WATERMARK)))
-    print('提取结果（翻转）   :', extract_lsb('data/attacks/flip.png',    len(WATERMARK)))
-    print('提取结果（平移）   :', extract_lsb('data/attacks/trans.png',   len(WATERMARK)))
-    print('提取结果（裁剪）   :', extract_lsb('data/attacks/crop.png',    len(WATERMARK)))
-    print('提取结果（对比度） :', extract_lsb('data/attacks/contrast.png', len(WATERMARK)))
\ No newline at end of file
+    n_bytes = len(WATERMARK.encode('utf-8'))
+    print('提取结果（无攻击） :', extract_lsb(STEGO_FILE, n_bytes))
+    print('提取结果（翻转）   :', extract_lsb('data/attacks/flip.png',    n_bytes))
+    print('提取结果（平移）   :', extract_lsb('data/attacks/trans.png',   n_bytes))
+    print('提取结果（裁剪）   :', extract_lsb('data/attacks/crop.png',    n_bytes))
+    print('提取结果（对比度） :', extract_lsb('data/attacks/contrast.png', n_bytes))
\ No newline at end of file
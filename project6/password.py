@@ -1,9 +1,45 @@
 import hashlib
 import hmac
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-from cryptography.hazmat.backends import default_backend
+import math
 import os
+import numpy as np
+
+# HKDF-SHA256 参数：salt=None 时按 RFC 5869 使用全零盐（长度等于哈希输出长度）
+ZERO_SALT = b'\x00' * 32
+HKDF_INFO = b'password-checkup-key'
+
+def _xor_bytes(a, b):
+    """
+    按字节异或两个字节串（与 zip 一致，按较短者截断）
+    转成大整数一次完成异或，避免逐字节的 Python 循环
+    :param a: 第一个字节串
+    :param b: 第二个字节串
+    :return: 异或结果
+    """
+    n = min(len(a), len(b))
+    return (int.from_bytes(a[:n], 'big') ^ int.from_bytes(b[:n], 'big')).to_bytes(n, 'big')
+
+def _hkdf_sha256(ikm, info=HKDF_INFO):
+    """
+    输出长度为 32 字节的 HKDF-SHA256（RFC 5869），只需两次 HMAC
+    Extract: PRK = HMAC(ZERO_SALT, ikm)
+    Expand:  OKM = T(1) = HMAC(PRK, info || 0x01)
+    :param ikm: 输入密钥材料
+    :param info: 上下文信息
+    :return: 32 字节派生密钥
+    """
+    prk = hmac.new(ZERO_SALT, ikm, hashlib.sha256).digest()
+    return hmac.new(prk, info + b'\x01', hashlib.sha256).digest()
+
+def _index_row(h_xor):
+    """
+    将h值编码为精确索引中的一行（40 字节 = 5 个大端 uint64）
+    前 32 字节为补零后的h值，末 8 字节记录原始长度，
+    使补零后相同但长度不同的h值不会被判为相等
+    :param h_xor: H(u) XOR v（不超过 32 字节）
+    :return: 40 字节的行数据
+    """
+    return h_xor.ljust(32, b'\x00') + len(h_xor).to_bytes(8, 'big')
 
 class PasswordCheckupClient:
     """
@@ -26,14 +62,7 @@ class PasswordCheckupClient:
         对应论文中的步骤1
         """
         # 使用HKDF算法派生密钥
-        hkdf = HKDF(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=None,
-            info=b'password-checkup-key',
-            backend=default_backend()
-        )
-        secret_key = hkdf.derive(self.password.encode())  # 从密码派生出密钥
+        secret_key = _hkdf_sha256(self.password.encode())  # 从密码派生出密钥
         
         # 计算u值：使用HMAC-SHA256算法，以secret_key为密钥，用户名为消息
         h = hmac.new(secret_key, self.username.encode(), hashlib.sha256)
@@ -57,18 +86,44 @@ class PasswordCheckupServer:
         """
         self.leaked_db = set(leaked_creds_db)  # 将泄露的凭证存储为集合
         
-    def build_bloom_filter(self):
+    def build_bloom_filter(self, fp_rate=0.01):
         """
-        构建布隆过滤器
-        简化实现，实际应用中应使用更高效的数据结构
+        构建布隆过滤器（bytearray 位数组 + k 个哈希位置）
+        位数 m = -n*ln(p)/(ln2)^2，哈希个数 k = (m/n)*ln2，默认误判率 1% 时 k = 7
+        :param fp_rate: 目标误判率 p
         """
-        # 初始化布隆过滤器
-        self.filter = set()
+        n = max(len(self.leaked_db), 1)
+        self.filter_bits = max(8, math.ceil(-n * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.filter_bits / n * math.log(2)))
+
+        # 初始化布隆过滤器（全零位数组）
+        self.filter = bytearray((self.filter_bits + 7) // 8)
+        h_values = []
         for u, v in self.leaked_db:
             # 计算h值：H(u) XOR v
             h_u = hashlib.sha256(u).digest()  # 对u进行SHA256哈希
-            h_xor = bytes(a ^ b for a, b in zip(h_u, v))  # 计算XOR结果
-            self.filter.add(h_xor)  # 将结果添加到布隆过滤器中
+            h_xor = _xor_bytes(h_u, v)  # 计算XOR结果
+            for idx in self._bloom_positions(h_xor):  # 将结果对应的k个位置1
+                self.filter[idx >> 3] |= 1 << (idx & 7)
+            h_values.append(_index_row(h_xor))
+
+        # 精确索引：所有h值（连同长度）按字节序排序后连续存放为 (N, 5) 的大端 uint64 数组，
+        # 首列单独拷贝一份作为二分查找的键，用于排除布隆过滤器的误判
+        self.sorted_db = np.frombuffer(b''.join(sorted(h_values)), dtype='>u8').reshape(-1, 5)
+        self.sorted_keys = self.sorted_db[:, 0].copy()
+
+    def _bloom_positions(self, h_xor):
+        """
+        计算h值在布隆过滤器中的k个位置
+        只做一次SHA256，用双重哈希 g_i = h1 + i*h2 (mod m) 派生k个下标
+        :param h_xor: H(u) XOR v
+        :return: k个位下标
+        """
+        digest = hashlib.sha256(h_xor).digest()
+        h1 = int.from_bytes(digest[:16], 'big')
+        h2 = int.from_bytes(digest[16:], 'big') | 1
+        m = self.filter_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
     
     def check_password(self, client_u, client_v):
         """
@@ -77,10 +132,18 @@ class PasswordCheckupServer:
         """
         # 计算h值：H(client_u) XOR client_v
         h_u = hashlib.sha256(client_u).digest()  # 对client_u进行SHA256哈希
-        h_xor = bytes(a ^ b for a, b in zip(h_u, client_v))  # 计算XOR结果
+        h_xor = _xor_bytes(h_u, client_v)  # 计算XOR结果
         
-        # 检查h值是否在布隆过滤器中
-        return h_xor in self.filter
+        # 检查h值对应的k个位是否全部为1（有任一位为0则一定未泄露）
+        if not all(self.filter[idx >> 3] >> (idx & 7) & 1
+                   for idx in self._bloom_positions(h_xor)):
+            return False
+
+        # 布隆过滤器命中后在精确索引中确认：按首个 uint64 二分定位，再整行比较
+        query = np.frombuffer(_index_row(h_xor), dtype='>u8')
+        lo = np.searchsorted(self.sorted_keys, query[0], side='left')
+        hi = np.searchsorted(self.sorted_keys, query[0], side='right')
+        return bool((self.sorted_db[lo:hi] == query).all(axis=1).any())
 
 # 使用示例
 if __name__ == "__main__":